@@ -4,15 +4,174 @@ Analyze code files to identify logical split points.
 Helps determine where to split large files.
 """
 
+import hashlib
+import heapq
+import json
 import re
+import sqlite3
 import sys
+from bisect import bisect_left
+from contextlib import closing
 from pathlib import Path
 
+from extract_lines import count_lines, load_source
 
-def analyze_file(filepath):
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# On-disk cache of analyze_file() results, one row per file, reused while
+# the file content is unchanged. Stored under the home directory, which is
+# looked up only when the cache is opened
+_CACHE_PATH = Path('.cache') / 'codesplitter' / 'analyses.sqlite'
+# Bump whenever analyze_file() output changes so stale rows are ignored
+_CACHE_VERSION = 4
+# Smaller files are rescanned instead, as opening the database costs more
+# than scanning them
+_CACHE_MIN_BYTES = 16 * 1024
+
+
+# Pattern definitions based on file type, compiled once at import:
+# (function, class, import). Function and class patterns capture the
+# identifier in a 'name' group.
+_PY_PATTERNS = (
+    re.compile(r'^(?:async\s+)?def\s+(?P<name>\w+)'),
+    re.compile(r'^class\s+(?P<name>\w+)'),
+    re.compile(r'^(from\s+.+\s+import|import\s+)'),
+)
+_JS_PATTERNS = (
+    # Arrow and function-expression consts are checked in a lookahead so
+    # every form captures its name through the same group
+    re.compile(r'^(?:export\s+)?(?:(?:async\s+)?function\s+|const\s+(?=\w+\s*=\s*(?:async\s+)?(?:.*=>|function)))(?P<name>\w+)'),
+    re.compile(r'^(?:export\s+)?class\s+(?P<name>\w+)'),
+    re.compile(r'^(import\s+|export\s+.+\s+from)'),
+)
+_JAVA_PATTERNS = (
+    re.compile(r'^\s*(?:public|private|protected|static|\s)+\s+\w+\s+(?P<name>\w+)\s*\('),
+    re.compile(r'^(?:public\s+)?class\s+(?P<name>\w+)'),
+    re.compile(r'^import\s+'),
+)
+_GENERIC_PATTERNS = (
+    re.compile(r'(?:function|def)\s+(?P<name>\w+)'),
+    re.compile(r'class\s+(?P<name>\w+)'),
+    re.compile(r'^(import|#include|using)'),
+)
+
+_PATTERNS = {
+    '.py': _PY_PATTERNS,
+    '.js': _JS_PATTERNS,
+    '.jsx': _JS_PATTERNS,
+    '.ts': _JS_PATTERNS,
+    '.tsx': _JS_PATTERNS,
+    '.java': _JAVA_PATTERNS,
+}
+
+# Section markers (comments that might indicate sections), matched against
+# the stripped line: a rule like '# -----' or an all-caps title
+_SECTION_RE = re.compile(r'^[/#*]+\s*(?:[-=]+|[A-Z](?:[A-Z]|\s)+[A-Z])')
+
+
+def _compile_scanner(patterns):
+    """
+    Combine a (function, class, import) pattern set and the section marker
+    pattern into one multiline bytes pattern that finds every candidate
+    line in a single finditer() sweep over the raw file contents. Each
+    branch is a named group ('function', 'class', 'import', 'section'), so
+    a match's lastgroup tells which pattern the line belongs to.
+    
+    Comment lines only ever match the section branch, and code lines only
+    the function, class and import branches.
+    
+    Whitespace classes are narrowed to exclude newlines so no branch can
+    run across a line break, and word characters are widened to any
+    non-ASCII byte so UTF-8 identifiers still match. The patterns' own
+    'name' groups are dropped, as a group name may only appear once.
+    """
+    def line_bounded(pattern):
+        return pattern.replace(r'\s', r'[^\S\n]').replace(r'\w', r'[\w\x80-\xff]')
+    
+    code = '|'.join(
+        f'(?P<{kind}>{line_bounded(p.pattern).replace("(?P<name>", "(?:")})'
+        for kind, p in zip(('function', 'class', 'import'), patterns)
+    )
+    section = r'(?P<section>[^\S\n]*' + line_bounded(_SECTION_RE.pattern.lstrip('^')) + ')'
+    not_comment = r'(?![^\S\n]*(?:#|//|/\*|\*))'
+    return re.compile(f'^(?:{section}|{not_comment}(?:{code}))'.encode(), re.MULTILINE)
+
+
+# Everything analyze_file() needs per file type, built once at import:
+# ((function, class, import), scanner)
+_LANGUAGES = {ext: (patterns, _compile_scanner(patterns)) for ext, patterns in _PATTERNS.items()}
+_GENERIC_LANGUAGE = (_GENERIC_PATTERNS, _compile_scanner(_GENERIC_PATTERNS))
+
+
+def _json_dumps(obj):
+    """Serialize obj as indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(obj, indent=2)
+
+
+def _open_cache():
+    """
+    Open the analysis cache database, creating it on first use.
+    
+    Returns None if the cache cannot be opened; it is only an optimization,
+    so the caller falls back to a fresh analysis.
+    """
+    try:
+        cache_path = Path.home() / _CACHE_PATH
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(cache_path))
+    except (RuntimeError, KeyError, OSError, sqlite3.Error):
+        # RuntimeError and KeyError come from Path.home() when there is no
+        # HOME and no passwd entry for the user
+        return None
+    try:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses "
+            "(path TEXT PRIMARY KEY, digest TEXT NOT NULL, analysis_json TEXT NOT NULL)"
+        )
+    except sqlite3.Error:
+        conn.close()
+        return None
+    return conn
+
+
+def _cache_get(conn, path, digest):
+    """Return the cached analysis for path if it matches digest, else None."""
+    try:
+        row = conn.execute(
+            "SELECT analysis_json FROM analyses WHERE path = ? AND digest = ?",
+            (path, digest)
+        ).fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def _cache_put(conn, path, digest, analysis):
+    """Store an analysis, replacing any older entry for the same path."""
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (path, digest, analysis_json) VALUES (?, ?, ?)",
+                (path, digest, json.dumps(analysis))
+            )
+    except sqlite3.Error:
+        pass
+
+
+def analyze_file(filepath, use_cache=True):
     """
     Analyze a code file to identify logical sections and potential split points.
     
+    Results for files of at least _CACHE_MIN_BYTES are cached on disk keyed
+    by the file's SHA-256, so analyzing an unchanged file again skips the
+    scan. Pass use_cache=False to bypass it.
+    
     Returns dict with:
         - total_lines: total line count
         - functions: list of function definitions with line numbers
@@ -24,12 +183,42 @@ def analyze_file(filepath):
     if not path.exists():
         return {"error": f"File not found: {filepath}"}
     
-    with open(path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    # Shared with extract_lines, so extracting from this file later in the
+    # same process reuses the mapping and newline index
+    data, newlines = load_source(path)
+    
+    conn = None
+    if use_cache and len(data) >= _CACHE_MIN_BYTES:
+        conn = _open_cache()
+    if conn is None:
+        return _scan_source(path, data, newlines)
     
+    # One connection serves both the lookup and, on a miss, the store
+    with closing(conn):
+        cache_path = str(path.resolve())
+        # The patterns follow the suffix of the path as given, which a
+        # symlink can differ in from the file it resolves to
+        ext = path.suffix.lower()
+        digest = f"{_CACHE_VERSION}:{ext}:{hashlib.sha256(data).hexdigest()}"
+        cached = _cache_get(conn, cache_path, digest)
+        if cached is not None:
+            cached["file"] = str(path)
+            return cached
+        
+        analysis = _scan_source(path, data, newlines)
+        _cache_put(conn, cache_path, digest, analysis)
+    
+    return analysis
+
+
+def _scan_source(path, data, newlines):
+    """
+    Build the analyze_file() result for path from its mapped content and
+    newline index.
+    """
     analysis = {
         "file": str(path),
-        "total_lines": len(lines),
+        "total_lines": 0,
         "functions": [],
         "classes": [],
         "imports": {"start": None, "end": None},
@@ -38,70 +227,55 @@ def analyze_file(filepath):
     
     # Detect file type
     ext = path.suffix.lower()
+    (func_re, class_re, import_re), scanner = _LANGUAGES.get(ext, _GENERIC_LANGUAGE)
     
-    # Pattern definitions based on file type
-    if ext in ['.py']:
-        func_pattern = r'^(async\s+)?def\s+(\w+)'
-        class_pattern = r'^class\s+(\w+)'
-        import_pattern = r'^(from\s+.+\s+import|import\s+)'
-    elif ext in ['.js', '.jsx', '.ts', '.tsx']:
-        func_pattern = r'^(export\s+)?(async\s+)?function\s+(\w+)|^(export\s+)?const\s+(\w+)\s*=\s*(async\s+)?.*=>|^(export\s+)?const\s+(\w+)\s*=\s*(async\s+)?function'
-        class_pattern = r'^(export\s+)?class\s+(\w+)'
-        import_pattern = r'^(import\s+|export\s+.+\s+from)'
-    elif ext in ['.java']:
-        func_pattern = r'^\s*(public|private|protected|static|\s)+\s+\w+\s+(\w+)\s*\('
-        class_pattern = r'^(public\s+)?class\s+(\w+)'
-        import_pattern = r'^import\s+'
-    else:
-        # Generic patterns
-        func_pattern = r'function\s+(\w+)|def\s+(\w+)'
-        class_pattern = r'class\s+(\w+)'
-        import_pattern = r'^(import|#include|using)'
-    
-    # Track imports section
-    import_started = False
-    import_ended = False
+    analysis["total_lines"] = count_lines(newlines, len(data))
     
-    # Analyze line by line
-    for i, line in enumerate(lines, 1):
+    # Let the regex engine find candidate lines in the raw bytes, and only
+    # decode and classify those in Python
+    index = 0
+    for m in scanner.finditer(data):
+        start = m.start()
+        # Matches come in order, so each search starts from the last one
+        index = bisect_left(newlines, start, index)
+        i = index + 1
+        end = newlines[index] + 1 if index < len(newlines) else len(data)
+        line = data[start:end].decode('utf-8', errors='replace')
         stripped = line.strip()
         
-        # Skip empty lines and comments for pattern matching
-        if not stripped or stripped.startswith('#') or stripped.startswith('//'):
-            continue
+        # The scanner branch tells which construct the line can be, so only
+        # that pattern runs again, to confirm the line and capture the name
+        kind = m.lastgroup
         
         # Check for imports
-        if re.match(import_pattern, line):
-            if not import_started:
-                analysis["imports"]["start"] = i
-                import_started = True
-            analysis["imports"]["end"] = i
-        elif import_started and not import_ended and not re.match(import_pattern, line):
-            import_ended = True
+        if kind == 'import':
+            if import_re.match(line):
+                if analysis["imports"]["start"] is None:
+                    analysis["imports"]["start"] = i
+                analysis["imports"]["end"] = i
         
         # Check for functions
-        func_match = re.match(func_pattern, line)
-        if func_match:
-            # Extract function name from groups
-            func_name = next((g for g in func_match.groups() if g and not g in ['export', 'async', 'const', '=>']), 'unknown')
-            analysis["functions"].append({
-                "name": func_name,
-                "line": i,
-                "definition": stripped[:50] + "..." if len(stripped) > 50 else stripped
-            })
+        elif kind == 'function':
+            func_match = func_re.match(line)
+            if func_match:
+                analysis["functions"].append({
+                    "name": func_match.group('name'),
+                    "line": i,
+                    "definition": stripped[:50] + "..." if len(stripped) > 50 else stripped
+                })
         
         # Check for classes
-        class_match = re.match(class_pattern, line)
-        if class_match:
-            class_name = next((g for g in class_match.groups() if g and g not in ['export', 'public']), 'unknown')
-            analysis["classes"].append({
-                "name": class_name,
-                "line": i,
-                "definition": stripped[:50] + "..." if len(stripped) > 50 else stripped
-            })
+        elif kind == 'class':
+            class_match = class_re.match(line)
+            if class_match:
+                analysis["classes"].append({
+                    "name": class_match.group('name'),
+                    "line": i,
+                    "definition": stripped[:50] + "..." if len(stripped) > 50 else stripped
+                })
         
         # Check for section markers (comments that might indicate sections)
-        if re.match(r'^[/#\*]+\s*[-=]+', stripped) or re.match(r'^[/#\*]+\s*[A-Z][A-Z\s]+[A-Z]', stripped):
+        elif _SECTION_RE.match(stripped):
             analysis["sections"].append({
                 "line": i,
                 "marker": stripped[:50]
@@ -121,28 +295,20 @@ def suggest_splits(analysis, target_size=200):
     Returns:
         List of suggested splits
     """
-    if "error" in analysis:
+    if "error" in analysis or analysis["total_lines"] <= target_size:
         return []
     
     suggestions = []
     total_lines = analysis["total_lines"]
     
-    if total_lines <= target_size:
-        return []
-    
     # Group related functions/classes
-    logical_breaks = []
-    
-    # Add class boundaries as logical breaks
-    for cls in analysis["classes"]:
-        logical_breaks.append((cls["line"], f"class {cls['name']}"))
-    
-    # Add major function groups
-    for func in analysis["functions"]:
-        logical_breaks.append((func["line"], f"function {func['name']}"))
-    
-    # Sort by line number
-    logical_breaks.sort(key=lambda x: x[0])
+    # Class boundaries and major function groups are logical breaks. Both
+    # lists are already in line order, so merge them instead of sorting
+    logical_breaks = list(heapq.merge(
+        ((cls["line"], f"class {cls['name']}") for cls in analysis["classes"]),
+        ((func["line"], f"function {func['name']}") for func in analysis["functions"]),
+        key=lambda x: x[0]
+    ))
     
     # Suggest splits
     if logical_breaks:
@@ -195,11 +361,13 @@ def main():
                        help='Target lines per split (default: 200)')
     parser.add_argument('--suggest', action='store_true',
                        help='Suggest split points')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Do not read or write the analysis cache')
     
     args = parser.parse_args()
     
     # Analyze the file
-    analysis = analyze_file(args.file)
+    analysis = analyze_file(args.file, use_cache=not args.no_cache)
     
     if "error" in analysis:
         print(f"Error: {analysis['error']}", file=sys.stderr)
@@ -227,6 +395,10 @@ def main():
             print(f"  ... and {len(analysis['functions']) - 10} more")
     
     if args.suggest:
+        if analysis["total_lines"] <= args.target_size:
+            print(f"\nNo splits needed: file is within the target size of {args.target_size} lines")
+            return
+        
         suggestions = suggest_splits(analysis, args.target_size)
         if suggestions:
             print(f"\nSuggested splits (target size: {args.target_size} lines):")
@@ -245,9 +417,8 @@ def main():
                     "start": split["start"],
                     "end": split["end"]
                 })
-            print(json.dumps(plan, indent=2))
+            print(_json_dumps(plan))
 
 
 if __name__ == "__main__":
-    import json
     main()
@@ -5,11 +5,91 @@ Processes extraction plans defined in JSON or command line.
 """
 
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from extract_lines import extract_lines
 
 
+def _group_extractions(extractions):
+    """
+    Split extractions into groups that are safe to run concurrently.
+
+    Extractions that touch a common file, as source or target, end up in
+    the same group and keep their plan order, since appends and 'move'
+    rewrites depend on the ones before them. Keeping every extraction
+    from one source in one group also means each source is mapped and
+    indexed only once (see load_source in extract_lines).
+
+    Returns:
+        List of groups, each a list of (index, extraction) tuples
+    """
+    groups = []
+
+    for i, extraction in enumerate(extractions):
+        paths = {
+            str(Path(extraction['source']).resolve()),
+            str(Path(extraction['target']).resolve())
+        }
+        members = [(i, extraction)]
+
+        # Merge every existing group that shares a file with this extraction
+        for j in reversed(range(len(groups))):
+            group_members, group_paths = groups[j]
+            if paths & group_paths:
+                del groups[j]
+                members = group_members + members
+                paths |= group_paths
+
+        members.sort(key=lambda member: member[0])
+        groups.append((members, paths))
+
+    return [members for members, _ in groups]
+
+
+def _run_extraction(extraction):
+    """
+    Run one extraction, turning an unexpected exception into an error
+    result so the rest of the batch is still reported.
+    """
+    try:
+        return extract_lines(
+            extraction['source'],
+            extraction['target'],
+            extraction['start'],
+            extraction['end'],
+            mode=extraction.get('mode', 'copy')
+        )
+    except Exception as e:
+        return {"error": f"Extraction failed: {e}"}
+
+
+def _run_group(group):
+    """
+    Run one group of extractions in order, returning (index, result) pairs.
+
+    The group runs in a single process, so repeated extractions from a
+    source reuse the mapping and newline index loaded by the first one.
+    """
+    return [(i, _run_extraction(extraction)) for i, extraction in group]
+
+
+def _report(i, total, extraction, result):
+    """Print the progress lines for one finished extraction and wrap its result."""
+    print(f"[{i + 1}/{total}] Processing: {extraction['source']} -> {extraction['target']}")
+    
+    if "error" in result:
+        print(f"  ✗ Error: {result['error']}", flush=True)
+    else:
+        print(f"  ✓ Extracted lines {result['extracted_range']}", flush=True)
+    
+    return {
+        "extraction": extraction,
+        "result": result
+    }
+
+
 def process_batch(extractions):
     """
     Process multiple extraction operations.
@@ -22,31 +102,45 @@ def process_batch(extractions):
             - end: end line (1-indexed)
             - mode: optional, 'copy' (default) or 'move'
 
+    Extractions that share no files run in parallel worker processes.
+
     Returns:
         List of results for each extraction
     """
+    groups = _group_extractions(extractions)
+    total = len(extractions)
     results = []
 
-    for i, extraction in enumerate(extractions, 1):
-        print(f"[{i}/{len(extractions)}] Processing: {extraction['source']} -> {extraction['target']}")
+    executor = None
+    if len(groups) > 1:
+        workers = min(len(groups), os.cpu_count() or 1)
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError, ImportError):
+            # No working multiprocessing here (e.g. no sem_open), so the
+            # batch runs serially instead
+            executor = None
 
-        result = extract_lines(
-            extraction['source'],
-            extraction['target'],
-            extraction['start'],
-            extraction['end'],
-            mode=extraction.get('mode', 'copy')
-        )
-        
-        results.append({
-            "extraction": extraction,
-            "result": result
-        })
-        
-        if "error" in result:
-            print(f"  ✗ Error: {result['error']}")
-        else:
-            print(f"  ✓ Extracted lines {result['extracted_range']}")
+    if executor is not None:
+        finished = {}
+        with executor:
+            futures = {executor.submit(_run_group, group): group for group in groups}
+            for future in as_completed(futures):
+                try:
+                    pairs = future.result()
+                except Exception as e:
+                    pairs = [(i, {"error": f"Extraction failed: {e}"}) for i, _ in futures[future]]
+                finished.update(pairs)
+                
+                # Report in plan order, as soon as every earlier extraction
+                # has finished
+                while len(results) in finished:
+                    i = len(results)
+                    results.append(_report(i, total, extractions[i], finished.pop(i)))
+    else:
+        # Plan order keeps every group's own order too
+        for i, extraction in enumerate(extractions):
+            results.append(_report(i, total, extraction, _run_extraction(extraction)))
     
     return results
 
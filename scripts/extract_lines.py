@@ -6,10 +6,138 @@ Efficient, context-preserving file splitting utility.
 
 import sys
 import os
+import errno
+import re
+import mmap
+import shutil
+import tempfile
 import argparse
 from pathlib import Path
 
 
+_NEWLINE_RE = re.compile(b'\n')
+
+# Sources loaded by this process, keyed by real path, so an analysis and the
+# extractions that follow it share one mapping and newline index while the
+# file is unchanged
+_SOURCES = {}
+_SOURCES_MAX = 32
+
+
+def _map_file(path):
+    """
+    Memory-map a file read-only. Empty files cannot be mapped, so b'' is
+    returned for them instead.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _newline_offsets(buffer):
+    """Return the byte offset of every newline in buffer, in order."""
+    return [m.start() for m in _NEWLINE_RE.finditer(buffer)]
+
+
+def count_lines(newlines, size):
+    """Count lines from a newline index, including an unterminated last line."""
+    if newlines and newlines[-1] == size - 1:
+        return len(newlines)
+    return len(newlines) + (1 if size else 0)
+
+
+def load_source(path):
+    """
+    Map a file read-only and index its newlines, reusing the result of an
+    earlier call in this process while the file is unchanged.
+
+    Returns (buffer, newlines) where newlines is the byte offset of every
+    newline in buffer.
+    """
+    real_path = os.path.realpath(path)
+    st = os.stat(real_path)
+    signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    # Re-inserting keeps _SOURCES ordered from least to most recently used
+    cached = _SOURCES.pop(real_path, None)
+    if cached is None or cached[0] != signature:
+        if len(_SOURCES) >= _SOURCES_MAX:
+            # Its mapping is released once nothing else holds it
+            del _SOURCES[next(iter(_SOURCES))]
+        buffer = _map_file(real_path)
+        cached = (signature, buffer, _newline_offsets(buffer))
+
+    _SOURCES[real_path] = cached
+    return cached[1], cached[2]
+
+
+def _line_span(newlines, size, start_line, end_line):
+    """
+    Translate lines start_line..end_line (1-indexed, inclusive) into a byte
+    range using a newline index.
+
+    Returns (start_byte, end_byte) such that buffer[start_byte:end_byte] holds
+    the lines including their trailing newlines.
+    """
+    start_byte = newlines[start_line - 2] + 1 if start_line > 1 else 0
+    end_byte = newlines[end_line - 1] + 1 if end_line <= len(newlines) else size
+    return start_byte, end_byte
+
+
+def _reserve_temp(path):
+    """
+    Create the temporary file that _remove_range() rewrites path through, in
+    the same directory so the final replace stays on one filesystem.
+
+    Returns (fd, tmp_path). Failing here means the directory is not writable.
+    """
+    real_path = os.path.realpath(path)
+    return tempfile.mkstemp(
+        dir=os.path.dirname(real_path),
+        prefix=f".{os.path.basename(real_path)}.",
+        suffix='.tmp'
+    )
+
+
+def _discard_temp(temp):
+    """Close and delete a temporary file from _reserve_temp() that went unused."""
+    fd, tmp_path = temp
+    os.close(fd)
+    try:
+        os.unlink(tmp_path)
+    except OSError:
+        pass
+
+
+def _remove_range(path, buffer, start_byte, end_byte, temp):
+    """
+    Atomically rewrite a file without buffer[start_byte:end_byte], where
+    buffer is the file's current content from load_source() and temp is
+    the (fd, tmp_path) pair from _reserve_temp().
+
+    The kept bytes are written straight from the mapping to the temporary
+    file, which then replaces the original. The mapping is closed before the
+    replace, as an open mapping blocks it on Windows.
+    """
+    real_path = os.path.realpath(path)
+    fd, tmp_path = temp
+    try:
+        with os.fdopen(fd, 'wb') as f, memoryview(buffer) as view:
+            f.write(view[:start_byte])
+            f.write(view[end_byte:])
+        shutil.copymode(real_path, tmp_path)
+        _SOURCES.pop(real_path, None)
+        buffer.close()
+        os.replace(tmp_path, real_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 def extract_lines(source_file, target_file, start_line, end_line, mode='copy', create_dirs=True):
     """
     Extract lines from source file to target file.
@@ -32,23 +160,27 @@ def extract_lines(source_file, target_file, start_line, end_line, mode='copy', c
     if not source_path.exists():
         return {"error": f"Source file not found: {source_file}"}
 
-    # Validate source file is writable if mode is 'move'
+    # In 'move' mode, opening the source for update up front is the probe
+    # for a read-only source file
     if mode == 'move':
-        if not os.access(source_path, os.W_OK):
-            return {"error": f"Source file is not writable: {source_file}. Cannot use 'move' mode on read-only files. Use 'copy' mode instead."}
-        # Check if parent directory is writable (in case file is in read-only filesystem)
-        if not os.access(source_path.parent, os.W_OK):
-            return {"error": f"Source directory is not writable: {source_path.parent}. Cannot use 'move' mode in read-only filesystem. Use 'copy' mode instead."}
+        try:
+            open(source_path, 'r+b').close()
+        except OSError as e:
+            if e.errno == errno.EROFS:
+                return {"error": f"Source directory is not writable: {source_path.parent}. Cannot use 'move' mode in read-only filesystem. Use 'copy' mode instead."}
+            if isinstance(e, PermissionError):
+                return {"error": f"Source file is not writable: {source_file}. Cannot use 'move' mode on read-only files. Use 'copy' mode instead."}
+            return {"error": f"Error reading source file: {e}"}
     
-    # Read source file
+    # Read source file, mapped as raw bytes so extracted and kept lines are
+    # copied without decoding or re-encoding them
     try:
-        with open(source_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        data, newlines = load_source(source_path)
+        total_lines = count_lines(newlines, len(data))
     except Exception as e:
         return {"error": f"Error reading source file: {e}"}
     
     # Validate line numbers
-    total_lines = len(lines)
     if start_line < 1 or start_line > total_lines:
         return {"error": f"Invalid start_line {start_line}. File has {total_lines} lines."}
     if end_line < start_line:
@@ -56,67 +188,69 @@ def extract_lines(source_file, target_file, start_line, end_line, mode='copy', c
     if end_line > total_lines:
         end_line = total_lines  # Adjust to file end
     
-    # Extract the lines (convert to 0-indexed)
-    extracted_lines = lines[start_line-1:end_line]
-
-    # Validate target directory is writable
-    target_dir = target_path.parent
-    if target_dir.exists():
-        if not os.access(target_dir, os.W_OK):
-            return {"error": f"Target directory is not writable: {target_dir}. Cannot write to read-only filesystem."}
-    else:
-        # Check if we can create the directory
-        if create_dirs:
-            # Find the first existing parent directory
-            parent = target_dir
-            while not parent.exists() and parent != parent.parent:
-                parent = parent.parent
-            if not os.access(parent, os.W_OK):
-                return {"error": f"Cannot create target directory in read-only location: {parent}"}
-        else:
-            return {"error": f"Target directory does not exist: {target_dir}"}
-
-    # Validate target file is writable if it exists
-    if target_path.exists() and not os.access(target_path, os.W_OK):
-        return {"error": f"Target file is not writable: {target_file}. Cannot write to read-only file."}
+    # Extract the lines
+    lines_extracted = end_line - start_line + 1
+    start_byte, end_byte = _line_span(newlines, len(data), start_line, end_line)
+    extracted = data[start_byte:end_byte]
 
+    # In 'move' mode, reserve the temporary file the source is rewritten
+    # through before the target is touched. Creating it is the probe for a
+    # read-only source directory, which would otherwise only show once the
+    # lines had already been written to the target
+    temp = None
+    if mode == 'move':
+        try:
+            temp = _reserve_temp(source_path)
+        except OSError as e:
+            if e.errno == errno.EROFS or isinstance(e, PermissionError):
+                return {"error": f"Source directory is not writable: {source_path.parent}. Cannot use 'move' mode in read-only filesystem. Use 'copy' mode instead."}
+            return {"error": f"Failed to modify source file: {e}"}
+    
     # Create target directory if needed
+    target_dir = target_path.parent
     if create_dirs:
         try:
-            target_path.parent.mkdir(parents=True, exist_ok=True)
+            target_dir.mkdir(parents=True, exist_ok=True)
         except OSError as e:
+            if temp:
+                _discard_temp(temp)
+            if e.errno == errno.EROFS or isinstance(e, PermissionError):
+                # e.filename is the directory that could not be created, so
+                # its parent is the existing read-only location
+                location = Path(e.filename).parent if e.filename else target_dir
+                return {"error": f"Cannot create target directory in read-only location: {location}"}
             return {"error": f"Failed to create target directory: {e}"}
     
     # Handle target file
     target_exists = target_path.exists()
     try:
         if target_exists:
-            # Check if file ends with newline before appending
-            needs_newline = False
-            try:
-                with open(target_path, 'r', encoding='utf-8') as f:
-                    f.seek(0, 2)  # Seek to end
-                    if f.tell() > 0:
-                        f.seek(f.tell() - 1)
-                        last_char = f.read(1)
-                        needs_newline = (last_char != '\n')
-            except Exception as e:
-                # If we can't read the file, proceed anyway
-                pass
-
-            # Append to existing file
-            with open(target_path, 'a', encoding='utf-8') as f:
-                if needs_newline:
-                    f.write('\n')
-                f.writelines(extracted_lines)
+            # Append through a single read/append handle, checking the last
+            # byte first so the extracted lines start on a fresh line. The
+            # separator is joined onto the payload so it goes out in one write
+            with open(target_path, 'ab+') as f:
+                size = f.seek(0, os.SEEK_END)
+                if size:
+                    f.seek(size - 1)
+                    if f.read(1) != b'\n':
+                        extracted = b''.join((b'\n', extracted))
+                f.write(extracted)
             action = "appended"
         else:
             # Create new file
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.writelines(extracted_lines)
+            with open(target_path, 'wb') as f:
+                f.write(extracted)
             action = "created"
     except OSError as e:
-        if e.errno == 30:  # EROFS - Read-only file system
+        if temp:
+            _discard_temp(temp)
+        if isinstance(e, FileNotFoundError):
+            return {"error": f"Target directory does not exist: {target_dir}"}
+        if isinstance(e, PermissionError):
+            if target_exists:
+                return {"error": f"Target file is not writable: {target_file}. Cannot write to read-only file."}
+            return {"error": f"Target directory is not writable: {target_dir}. Cannot write to read-only filesystem."}
+        if e.errno == errno.EROFS:
             return {"error": f"Cannot write to target file in read-only filesystem: {target_file}. Error: {e}"}
         else:
             return {"error": f"Failed to write to target file: {e}"}
@@ -124,13 +258,11 @@ def extract_lines(source_file, target_file, start_line, end_line, mode='copy', c
     # Handle source file if mode is 'move'
     if mode == 'move':
         # Remove extracted lines from source
-        remaining_lines = lines[:start_line-1] + lines[end_line:]
         try:
-            with open(source_path, 'w', encoding='utf-8') as f:
-                f.writelines(remaining_lines)
+            _remove_range(source_path, data, start_byte, end_byte, temp)
             source_action = "removed from source"
         except OSError as e:
-            if e.errno == 30:  # EROFS - Read-only file system
+            if e.errno == errno.EROFS:
                 return {"error": f"Cannot modify source file in read-only filesystem: {source_file}. Use --mode copy instead. Error: {e}"}
             else:
                 return {"error": f"Failed to modify source file: {e}"}
@@ -139,7 +271,7 @@ def extract_lines(source_file, target_file, start_line, end_line, mode='copy', c
     
     return {
         "success": True,
-        "lines_extracted": len(extracted_lines),
+        "lines_extracted": lines_extracted,
         "target_file": str(target_path),
         "target_action": action,
         "source_action": source_action,